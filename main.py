@@ -1,19 +1,23 @@
 from telegram import Update
+from telegram.constants import MessageLimit
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 import logging
 import os
 from datetime import datetime
 from dotenv import load_dotenv
-import openai
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+import httpx
 import asyncio
-import tempfile
+import io
+import json
+import re
+import uuid
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
 # Enable logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -22,12 +26,122 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# System prompts are kept identical across calls so OpenAI can cache them
+GERMAN_RESPONSE_INSTRUCTIONS = (
+    "You are a friendly German-speaking assistant. "
+    "Respond to the following message in natural, conversational German. "
+    "Keep your response concise and engaging, matching the tone of the input. "
+    "In case there are grammar mistakes, suggest an improvement with a correct version and explain it."
+)
+GERMAN_RESPONSE_PROMPT = {"role": "system", "content": GERMAN_RESPONSE_INSTRUCTIONS}
+RESPONSE_AND_WORDS_PROMPT = {"role": "system", "content": (
+    f"{GERMAN_RESPONSE_INSTRUCTIONS} "
+    "Reply in JSON as {\"reply\", \"words\": [{\"word\", \"translation\", \"context\"}]}, "
+    "reply first, with your response in reply and, in words, the 3 most significant German words "
+    "(nouns, verbs, adjectives) of your response with their English translation and "
+    "a brief explanation."
+)}
+WORD_TRANSLATIONS_PROMPT = {"role": "system", "content": (
+    "Extract the 3 most significant German words (nouns, verbs, adjectives) "
+    "from the text. Reply in JSON as {\"words\": [{\"word\", \"translation\", "
+    "\"context\"}]} with the German word, its English translation and a brief "
+    "explanation."
+)}
+
+# Start of the reply string in a partially streamed JSON response
+REPLY_START = re.compile(r'"reply"\s*:\s*"')
+
+def read_reply(content):
+    """Return the reply from a partially streamed JSON response once it is complete."""
+    match = REPLY_START.search(content)
+    if match is None:
+        return None
+    try:
+        return json.decoder.scanstring(content, match.end())[0]
+    except json.JSONDecodeError:
+        return None
+
+def format_word_translations(words):
+    """Format the key words returned by GPT as one line per word."""
+    return "\n".join(
+        f"• {word['word']} – {word['translation']}: {word['context']}"
+        for word in words[:3]
+    )
+
+# Text commands that switch the conversation mode, with their confirmations
+MODE_COMMANDS = {
+    "gesprächsmodus": "conversation",
+    "transkriptionsmodus": "default"
+}
+MODE_REPLIES = {
+    "conversation": (
+        "🔊 Gesprächsmodus aktiviert. "
+        "Ich werde jetzt nur mit Audioantworten kommunizieren."
+    ),
+    "default": (
+        "📝 Zurück zum Standardmodus. "
+        "Ich werde wieder vollständige Analysen durchführen."
+    )
+}
+
+# OpenAI failures that are usually gone on a second try
+RETRYABLE_ERRORS = (APIConnectionError, InternalServerError, RateLimitError, httpx.TransportError)
+
+def is_retryable(error):
+    """Check whether a failed OpenAI request is worth retrying."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, RETRYABLE_ERRORS)
+
+def openai_retrying():
+    """Retry OpenAI requests with exponential backoff and jitter."""
+    return AsyncRetrying(
+        wait=wait_exponential_jitter(initial=0.5, max=8),
+        stop=stop_after_attempt(5),
+        retry=retry_if_exception(is_retryable),
+        reraise=True
+    )
+
+# Updates waiting per chat before new ones are turned away
+CHAT_QUEUE_SIZE = 4
+
+# OpenAI requests in flight across all chats
+MAX_CONCURRENT_REQUESTS = 16
+
 class TelegramBot:
     def __init__(self, token: str):
         """Initialize bot with Telegram token."""
-        self.application = Application.builder().token(token).build()
-        self.conversation_mode = "default"
-        self.last_audio_response = None
+        builder = Application.builder().token(token).post_shutdown(self.post_shutdown)
+
+        # A local Bot API server stores voice files on disk instead of serving them for download
+        local_api_url = os.getenv("TELEGRAM_LOCAL_API_URL")
+        self.local_mode = bool(local_api_url)
+        if self.local_mode:
+            builder = (
+                builder.base_url(f"{local_api_url}/bot")
+                .base_file_url(f"{local_api_url}/file/bot")
+                .local_mode(True)
+            )
+        self.application = builder.build()
+        # One HTTP/2 connection pool shared by the OpenAI calls and Telegram voice file downloads
+        self.http_client = httpx.AsyncClient(
+            # Pool limits must be set on the transport; AsyncClient ignores them when given one
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            ),
+            timeout=httpx.Timeout(60, connect=5)
+        )
+        self.openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=self.http_client,
+            max_retries=0  # Retries are handled by openai_retrying
+        )
+        self.chat_model = os.getenv("CHAT_MODEL", "gpt-4o-mini")
+        self.chat_queues = {}
+        self.chat_workers = {}
+        self.api_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
         self.setup_handlers()
 
     def setup_handlers(self):
@@ -37,14 +151,88 @@ class TelegramBot:
         self.application.add_handler(CommandHandler("help", self.help_command))
         
         # Voice message handler
-        self.application.add_handler(MessageHandler(filters.VOICE, self.handle_voice))
+        self.application.add_handler(MessageHandler(filters.VOICE, self.queued(self.handle_voice)))
         
         # Text message handler
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
+        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.queued(self.handle_message)))
         
         # Error handler
         self.application.add_error_handler(self.error_handler)
 
+    def queued(self, callback):
+        """Wrap a handler so its updates run in order on the chat's queue."""
+        async def enqueue(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            await self.queue_update(update, context, callback)
+        return enqueue
+
+    async def queue_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback):
+        """Queue an update for its chat, so a slow chat does not hold up the others."""
+        chat_id = update.effective_chat.id
+        queue = self.chat_queues.get(chat_id)
+        if queue is None:
+            queue = self.chat_queues[chat_id] = asyncio.Queue(maxsize=CHAT_QUEUE_SIZE)
+        try:
+            queue.put_nowait((callback, update, context))
+        except asyncio.QueueFull:
+            await update.message.reply_text(
+                "Still working on your previous messages, please wait a moment."
+            )
+            return
+
+        if chat_id not in self.chat_workers:
+            self.chat_workers[chat_id] = self.application.create_task(
+                self.chat_worker(chat_id, queue)
+            )
+
+    async def chat_worker(self, chat_id: int, queue: asyncio.Queue):
+        """Process a chat's queued updates one at a time until the queue is empty."""
+        try:
+            while not queue.empty():
+                callback, update, context = queue.get_nowait()
+                try:
+                    await callback(update, context)
+                except Exception as e:
+                    # Hand the error to the application's error handlers, as before queueing
+                    await self.application.process_error(update, e)
+                finally:
+                    queue.task_done()
+        finally:
+            del self.chat_workers[chat_id]
+            del self.chat_queues[chat_id]
+
+    async def show_progress(self, message, text):
+        """Update a status message, without letting a failed cosmetic edit end the turn."""
+        try:
+            await message.edit_text(text)
+        except TelegramError as e:
+            logger.warning(f"Could not update status message: {str(e)}")
+
+    async def edit_or_reply(self, update: Update, message, text):
+        """Edit a status message into a final text, or send the text as a new reply if that fails."""
+        try:
+            await self.send_with_retry(message.edit_text, text)
+        except TelegramError as e:
+            logger.warning(f"Could not update status message: {str(e)}")
+            await self.send_with_retry(update.message.reply_text, text)
+
+    def delete_in_background(self, message):
+        """Delete a status message without holding up the reply that replaces it."""
+        # Tasks started by the application are tracked and their errors logged
+        self.application.create_task(message.delete())
+
+    async def send_with_retry(self, send, *args, **kwargs):
+        """Call a Telegram send method, waiting and trying once more if rate limited."""
+        try:
+            return await send(*args, **kwargs)
+        except RetryAfter as e:
+            logger.warning(f"Rate limited by Telegram, retrying in {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+            # Rewind any files the first attempt already read
+            for value in kwargs.values():
+                if isinstance(value, io.IOBase):
+                    value.seek(0)
+            return await send(*args, **kwargs)
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send a message when the command /start is issued."""
         user = update.effective_user
@@ -81,6 +269,8 @@ Special Commands:
 
     async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle voice messages."""
+        processing_message = None
+        transcript = None
         try:
             # Send a processing message
             processing_message = await update.message.reply_text("Processing your voice message...")
@@ -88,227 +278,300 @@ Special Commands:
             # Download the voice message
             voice_file = await context.bot.get_file(update.message.voice.file_id)
             
-            with tempfile.NamedTemporaryFile(suffix='.oga') as voice_temp:
-                # Download voice file to temporary location
-                await voice_file.download_to_drive(voice_temp.name)
-                
-                # Transcribe with Whisper
-                with open(voice_temp.name, 'rb') as audio_file:
+            # Transcribe with Whisper
+            if self.local_mode:
+                # file_path is where the local server saved the voice file
+                with open(voice_file.file_path, 'rb') as audio_file:
                     transcript = await self.transcribe_audio(audio_file)
-
-            # Handle different conversation modes
-            if self.conversation_mode == "default":
-                await processing_message.delete()
-                await self.handle_default_mode(update, transcript)
-            elif self.conversation_mode == "conversation":
-                await processing_message.delete()
-                await self.handle_conversation_mode(update, transcript)
-            elif self.conversation_mode == "transcription":
-                await processing_message.delete()
-                await self.handle_transcription_mode(update, transcript)
+            elif voice_file.file_size:
+                transcript = await self.transcribe_voice_file(voice_file)
+            else:
+                # Keep the voice file in memory; the name tells Whisper the format
+                voice_buffer = io.BytesIO(await voice_file.download_as_bytearray())
+                voice_buffer.name = "voice.oga"
+                transcript = await self.transcribe_audio(voice_buffer)
+
+            # Handle different conversation modes (kept per user)
+            conversation_mode = context.user_data.get("mode", "default")
+            if conversation_mode == "default":
+                await self.handle_default_mode(update, context, transcript, processing_message)
+            elif conversation_mode == "conversation":
+                self.delete_in_background(processing_message)
+                processing_message = None
+                await self.handle_conversation_mode(update, context, transcript)
+            elif conversation_mode == "transcription":
+                await self.handle_transcription_mode(update, transcript, processing_message)
 
         except Exception as e:
             logger.error(f"Error processing voice message: {str(e)}")
-            await update.message.reply_text(
+            error_text = (
                 "Sorry, I encountered an error processing your voice message. "
                 "Please try again later."
             )
+            if transcript is not None:
+                error_text = f"📝 Transcription:\n{transcript}\n\n{error_text}"
+
+            # Replace the status message so it doesn't stay stuck on a progress step
+            if processing_message is not None:
+                await self.edit_or_reply(update, processing_message, error_text)
+            else:
+                await update.message.reply_text(error_text)
             
-    async def handle_default_mode(self, update: Update, transcript: str):
+    async def handle_default_mode(self, update: Update, context: ContextTypes.DEFAULT_TYPE, transcript: str, status_message):
             """Full analysis mode with text and audio responses."""
+            question = f"📝 Frage Transkription:\n{transcript}"
 
-            # Send a processing response message
-            processing_response = await update.message.reply_text("Processing a response to you...")
+            # Show the transcript in the status message while the response is prepared
+            await self.show_progress(status_message, f"{question}\n\n⏳ Generating a response...")
 
-            # Process the German text with GPT
-            # understanding = await self.process_german_text(transcript)
-            
-            # Extract and translate key words
-            word_translations = await self.extract_word_translations(transcript)
-            
-            # Generate German audio response
-            german_response = await self.generate_german_response(transcript)
-            audio_response = await self.generate_audio_response(german_response)
+            # Generate German response together with its audio and key words
+            german_response, audio_response, word_translations = await self.respond_and_extract(transcript)
             
             # Store the audio response for potential transcription
-            self.last_audio_response = audio_response
-
-            await update.message.reply_text(
-                f"📝 Frage Transkription:\n{transcript} \n\n"
-            )
+            context.user_data["last_audio_response"] = audio_response
             
-            await processing_response.delete()
-
-            # Send audio response
-            with tempfile.NamedTemporaryFile(suffix='.mp3') as audio_temp:
-                audio_temp.write(audio_response)
-                audio_temp.seek(0)
-                await update.message.reply_voice(voice=audio_temp)
-
-            # Extract and translate key words
-            word_translations = await self.extract_word_translations(german_response)
-
-             # Send german_respose
-            await update.message.reply_text(
-                f"📝 Antwort Transkription:\n{german_response} \n\n"
-                f"💡 Understanding:\n{word_translations}\n\n"
+            answer = f"📝 Antwort Transkription:\n{german_response}"
+            if word_translations:
+                answer += f"\n\n💡 Understanding:\n{word_translations}"
+            caption = f"{question}\n\n{answer}"
+
+            audio_buffer = io.BytesIO(audio_response)
+            audio_buffer.name = "response.ogg"
+
+            # Telegram measures captions in UTF-16 code units, so emoji count double
+            if len(caption.encode("utf-16-le")) // 2 <= MessageLimit.CAPTION_LENGTH:
+                # Send everything as one voice message, then drop the status message it replaces
+                await self.send_with_retry(update.message.reply_voice, voice=audio_buffer, caption=caption)
+                self.delete_in_background(status_message)
+            else:
+                # Too long for a caption: keep the question and answer as separate messages
+                await self.edit_or_reply(update, status_message, question)
+                await self.send_with_retry(update.message.reply_voice, voice=audio_buffer)
+                await self.send_with_retry(update.message.reply_text, answer)
 
-            )
     async def transcribe_audio(self, audio_file):
         """Transcribe audio using OpenAI's Whisper API."""
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: openai.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="de"
-                )
-            )
+            async for attempt in openai_retrying():
+                with attempt:
+                    audio_file.seek(0)
+                    async with self.api_semaphore:
+                        response = await self.openai_client.audio.transcriptions.create(
+                            model="whisper-1",
+                            file=audio_file,
+                            language="de"
+                        )
             return response.text
         except Exception as e:
             logger.error(f"Error in transcription: {str(e)}")
             raise
 
-    async def process_german_text(self, text):
-        """Process German text using OpenAI's GPT model."""
+    async def transcribe_voice_file(self, voice_file):
+        """Transcribe a Telegram voice file, uploading it to Whisper while it downloads."""
+        boundary = uuid.uuid4().hex
+        head = (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="model"\r\n\r\nwhisper-1\r\n'
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="language"\r\n\r\nde\r\n'
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="voice.oga"\r\n'
+            "Content-Type: audio/ogg\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        async def body():
+            yield head
+            async with self.http_client.stream("GET", voice_file.file_path) as download:
+                download.raise_for_status()
+                async for chunk in download.aiter_bytes():
+                    yield chunk
+            yield tail
+
+        # Same auth, organization and project headers the SDK sends (unset ones are Omit markers)
+        openai_headers = {
+            name: value for name, value in self.openai_client.default_headers.items()
+            if isinstance(value, str)
+        }
+
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": (
-                            "You are a helpful assistant processing German messages. "
-                            "Analyze the content and provide a clear understanding "
-                            "in English. Be concise but thorough."
-                        )},
-                        {"role": "user", "content": text}
-                    ]
-                )
-            )
-            return response.choices[0].message.content
+            async for attempt in openai_retrying():
+                with attempt:
+                    async with self.api_semaphore:
+                        response = await self.http_client.post(
+                            f"{self.openai_client.base_url}audio/transcriptions",
+                            content=body(),
+                            headers={
+                                **openai_headers,
+                                "Content-Type": f"multipart/form-data; boundary={boundary}",
+                                "Content-Length": str(len(head) + voice_file.file_size + len(tail))
+                            }
+                        )
+                        response.raise_for_status()
+            return response.json()["text"]
         except Exception as e:
-            logger.error(f"Error in text processing: {str(e)}")
+            logger.error(f"Error in transcription: {str(e)}")
             raise
 
     async def generate_german_response(self, text):
         """Generate a German response to the input text."""
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": (
-                            "You are a friendly German-speaking assistant. "
-                            "Respond to the following message in natural, conversational German. "
-                            "Keep your response concise and engaging, matching the tone of the input. "
-                            "In case there are grammar mistakes, suggest an improvement with a correct version and explain it."
-                        )},
-                        {"role": "user", "content": text}
-                    ]
-                )
-            )
+            async for attempt in openai_retrying():
+                with attempt:
+                    async with self.api_semaphore:
+                        response = await self.openai_client.chat.completions.create(
+                            model=self.chat_model,
+                            messages=[
+                                GERMAN_RESPONSE_PROMPT,
+                                {"role": "user", "content": text}
+                            ]
+                        )
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"Error generating German response: {str(e)}")
             raise
 
+    async def respond_and_extract(self, text):
+        """Generate a German response, its audio and its key word translations.
+
+        The response and key words come from one streamed request; the audio is
+        started as soon as the response is complete, while the key words are
+        still being generated. The key words are None if they could not be
+        generated.
+        """
+        audio_request = None
+        try:
+            async for attempt in openai_retrying():
+                with attempt:
+                    # A retried request gives a new response, so its audio starts over
+                    if audio_request is not None:
+                        audio_request.cancel()
+                        audio_request = None
+                    content = ""
+                    async with self.api_semaphore:
+                        stream = await self.openai_client.chat.completions.create(
+                            model=self.chat_model,
+                            response_format={"type": "json_object"},
+                            messages=[
+                                RESPONSE_AND_WORDS_PROMPT,
+                                {"role": "user", "content": text}
+                            ],
+                            stream=True
+                        )
+                        # Closes the HTTP stream even if reading it fails part way
+                        async with stream:
+                            async for chunk in stream:
+                                if chunk.choices:
+                                    content += chunk.choices[0].delta.content or ""
+                                if audio_request is None:
+                                    german_response = read_reply(content)
+                                    if german_response is not None:
+                                        audio_request = asyncio.create_task(
+                                            self.generate_audio_response(german_response)
+                                        )
+            result = json.loads(content)
+            german_response = result["reply"]
+            if audio_request is None:
+                audio_request = asyncio.create_task(self.generate_audio_response(german_response))
+
+            try:
+                word_translations = format_word_translations(result["words"])
+            except (KeyError, TypeError) as e:
+                # Fall back to a separate request if the key words came back malformed
+                logger.warning(f"Missing key words in response, requesting them separately: {str(e)}")
+                try:
+                    word_translations = await self.request_word_translations(german_response)
+                except Exception:
+                    # The reply and audio are done; send them without key words
+                    word_translations = None
+
+            audio_response = await audio_request
+        except Exception as e:
+            if audio_request is not None:
+                audio_request.cancel()
+            logger.error(f"Error generating German response: {str(e)}")
+            raise
+        return german_response, audio_response, word_translations
+
     async def generate_audio_response(self, text):
         """Generate audio response using OpenAI's TTS."""
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: openai.audio.speech.create(
-                    model="tts-1",
-                    voice="echo",  # Can be alloy, echo, fable, onyx, nova, or shimmer
-                    input=text
-                )
-            )
+            async for attempt in openai_retrying():
+                with attempt:
+                    async with self.api_semaphore:
+                        response = await self.openai_client.audio.speech.create(
+                            model="tts-1",
+                            voice="echo",  # Can be alloy, echo, fable, onyx, nova, or shimmer
+                            input=text,
+                            response_format="opus"  # Telegram's native voice note format
+                        )
             return response.content
         except Exception as e:
             logger.error(f"Error generating audio response: {str(e)}")
             raise
 
-    async def extract_word_translations(self, text):
-        """Extract and translate key German words."""
+    async def request_word_translations(self, text):
+        """Ask GPT for the key German words and their translations."""
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": (
-                            "Extract the 3 most significant German words from the text. "
-                            "For each word, provide: \n"
-                            "- The German word\n"
-                            "- Its English translation\n"
-                            "- A brief context or explanation\n"
-                            "Focus on nouns, verbs, and adjectives that carry key meaning. "
-                            "Limit to 3 words maximum."
-                        )},
-                        {"role": "user", "content": text}
-                    ]
-                )
-            )
-            return response.choices[0].message.content
+            async for attempt in openai_retrying():
+                with attempt:
+                    async with self.api_semaphore:
+                        response = await self.openai_client.chat.completions.create(
+                            model=self.chat_model,
+                            response_format={"type": "json_object"},
+                            messages=[
+                                WORD_TRANSLATIONS_PROMPT,
+                                {"role": "user", "content": text}
+                            ]
+                        )
+            words = json.loads(response.choices[0].message.content)["words"]
+            return format_word_translations(words)
         except Exception as e:
             logger.error(f"Error in word extraction: {str(e)}")
             raise
-    async def handle_conversation_mode(self, update: Update, transcript: str):
+    async def handle_conversation_mode(self, update: Update, context: ContextTypes.DEFAULT_TYPE, transcript: str):
         """Conversation mode - audio only response."""
         # Generate German audio response
         german_response = await self.generate_german_response(transcript)
         audio_response = await self.generate_audio_response(german_response)
         
         # Store the audio response for potential transcription
-        self.last_audio_response = audio_response
+        context.user_data["last_audio_response"] = audio_response
         
         # Send audio response
-        with tempfile.NamedTemporaryFile(suffix='.mp3') as audio_temp:
-            audio_temp.write(audio_response)
-            audio_temp.seek(0)
-            await update.message.reply_voice(voice=audio_temp)
+        audio_buffer = io.BytesIO(audio_response)
+        audio_buffer.name = "response.ogg"
+        await self.send_with_retry(update.message.reply_voice, voice=audio_buffer)
         
         print(german_response)
         # Send german_respose
-        await update.message.reply_text(
+        await self.send_with_retry(update.message.reply_text,
             f"📝 Transkription:\n{german_response}"
         )
 
-    async def handle_transcription_mode(self, update: Update, transcript: str):
+    async def handle_transcription_mode(self, update: Update, transcript: str, status_message):
         """Transcription mode - just transcribe the input."""
-        await update.message.reply_text(
+        await self.edit_or_reply(update, status_message,
             f"📝 Transcription:\n{transcript}"
         )
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle text messages and mode switches."""
-        text = update.message.text.lower().strip()
+        text = update.message.text.strip().casefold()
+        mode = MODE_COMMANDS.get(text)
         
-        if text == "gesprächsmodus":
-            self.conversation_mode = "conversation"
-            await update.message.reply_text(
-                "🔊 Gesprächsmodus aktiviert. "
-                "Ich werde jetzt nur mit Audioantworten kommunizieren."
-            )
-        elif text == "transkriptionsmodus":
-            self.conversation_mode = "default"
-            await update.message.reply_text(
-                "📝 Zurück zum Standardmodus. "
-                "Ich werde wieder vollständige Analysen durchführen."
-            )
+        if mode is not None:
+            context.user_data["mode"] = mode
+            await update.message.reply_text(MODE_REPLIES[mode])
         elif text == "transkribieren":
-            if self.last_audio_response:
+            last_audio_response = context.user_data.get("last_audio_response")
+            if last_audio_response:
                 # Transcribe the last audio response
-                with tempfile.NamedTemporaryFile(suffix='.mp3') as audio_temp:
-                    audio_temp.write(self.last_audio_response)
-                    audio_temp.seek(0)
-                    with open(audio_temp.name, 'rb') as audio_file:
-                        last_audio_transcript = await self.transcribe_audio(audio_file)
+                audio_buffer = io.BytesIO(last_audio_response)
+                audio_buffer.name = "response.ogg"
+                last_audio_transcript = await self.transcribe_audio(audio_buffer)
                 
-                await update.message.reply_text(
+                await self.send_with_retry(update.message.reply_text,
                     f"📝 Transkription der letzten Audioantwort:\n{last_audio_transcript}"
                 )
             else:
@@ -324,13 +587,24 @@ Special Commands:
 
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Log Errors caused by Updates."""
-        logger.error(f"Exception while handling an update: {context.error}")
+        logger.error(f"Exception while handling an update: {context.error}", exc_info=context.error)
+
+    async def post_shutdown(self, application: Application):
+        """Close the OpenAI connection pool once the bot has stopped."""
+        await self.openai_client.close()
 
     def run(self):
         """Start the bot."""
         self.application.run_polling()
 
 def main():
+    # uvloop is faster at socket I/O than the default event loop (not available on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        logger.info("uvloop not installed, using the default asyncio event loop")
+
     # Get tokens from .env file
     telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
     openai_key = os.getenv("OPENAI_API_KEY")